@@ -131,20 +131,60 @@ Intelligence Programming" by Peter Norvig.
 # - `rename_vars`: replace variables in this instance using a dictionary that
 #   maps old variables to replacement variables.
 
+# Atoms never change, and the same literals tend to show up over and over in a
+# database of clauses, so we only ever create one Atom for each literal and hand
+# out that same instance every time it's asked for.
+#
+# We do the same for Vars, since a variable is identified by its name.  Having a
+# single Var per name means that two Vars are equal exactly when they are the
+# same object, so the bindings dictionaries (which are keyed on Vars) can use
+# Python's built-in identity hashing and comparison.
+#
+# Atoms are interned by type as well as by literal, so that 1 and 1.0 keep their
+# own types.  Equal literals of different types (1 and 1.0, or 'a' and u'a')
+# are still equal Atoms, though, so Atoms compare their literals whenever they
+# aren't the same object.
+
 # ----------------------------------------------------------------------------
 
+import weakref
+
 class Atom(object):
 
     """Represents any literal (symbol, number, string, etc)."""
+
+    __slots__ = ('atom', '__weakref__')
+
+    # Maps (type, literal) to the Atom for that literal.  The type is part of
+    # the key so that, for example, 1 and 1.0 remain distinct Atoms.
+    instances = weakref.WeakValueDictionary()
     
-    def __init__(self, atom):
-        self.atom = atom
+    def __new__(cls, atom):
+        key = (type(atom), atom)
+        instance = Atom.instances.get(key)
+        if instance is None:
+            instance = object.__new__(cls)
+            instance.atom = atom
+            Atom.instances[key] = instance
+        return instance
+
+    # Copying or unpickling an Atom goes back through __new__, and so gives
+    # the interned instance.
+    def __reduce__(self):
+        return (Atom, (self.atom,))
         
     def __repr__(self):
         return str(self.atom)
 
     def __eq__(self, other):
-        return isinstance(other, Atom) and other.atom == self.atom
+        return self is other or (isinstance(other, Atom) and
+                                 other.atom == self.atom)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.atom)
 
     # These don't need to do anything for Atoms, since they don't contain Vars.
     def rename_vars(self, replacements): return self
@@ -155,6 +195,11 @@ class Var(object):
 
     """Represents a logic variable."""
 
+    __slots__ = ('var', '__weakref__')
+
+    # Maps each name to the Var with that name.
+    instances = weakref.WeakValueDictionary()
+
     counter = 0 # for generating unused variables
     @staticmethod
     def get_unused_var():
@@ -165,19 +210,30 @@ class Var(object):
         v = Var('var%d' % Var.counter)
         Var.counter += 1
         return v
+
+    @staticmethod
+    def get_unused_vars(n):
+        """Get a list of n new, unused Vars."""
+        # Renaming a clause needs a fresh Var for each of its variables, so
+        # reserve them all with a single update to the counter.
+        begin = Var.counter
+        Var.counter += n
+        return [Var('var%d' % i) for i in xrange(begin, begin + n)]
     
-    def __init__(self, var):
-        self.var = var
+    def __new__(cls, var):
+        instance = Var.instances.get(var)
+        if instance is None:
+            instance = object.__new__(cls)
+            instance.var = var
+            Var.instances[var] = instance
+        return instance
+
+    def __reduce__(self):
+        return (Var, (self.var,))
         
     def __repr__(self):
         return '?%s' % str(self.var)
 
-    def __eq__(self, other):
-        return isinstance(other, Var) and other.var == self.var
-
-    def __hash__(self):
-        return hash(self.var)
-
     # As mentioned above in the section on "Goals", variables will be bound
     # to other values.  These bindings will be tracked through dictionaries.
 
@@ -186,10 +242,23 @@ class Var(object):
         Find the term that self is bound to in bindings.
 
         Tries to find a non-Var binding to return by searching transitively
-        through the bindings dictionary.
+        through the bindings dictionary.  Every Var passed through along the
+        way is rebound directly to the result, so bindings may be updated.
         """
         
-        binding = bindings.get(self)
+        # Each step along the chain of bindings is a single dictionary access,
+        # so we look up `get` just once and walk the chain in a loop.
+        get = bindings.get
+        binding = get(self)
+
+        # Most lookups are for Vars that are unbound or bound directly to a
+        # non-Var term, and there's no chain to walk for those.
+        if binding is None:
+            return None
+        if type(binding) is not Var:
+            if isinstance(binding, Relation):
+                return binding.bind_vars(bindings)
+            return binding
 
         # While looking up the binding for self, we must detect:
         # 
@@ -198,12 +267,27 @@ class Var(object):
         #    terminal Atom in a transitive binding
         # 3. That we don't go in a circle (eg, x->y and y->x)
 
-        encountered = [self, binding]
-        while (isinstance(binding, Var)
-               and binding in bindings
-               and bindings[binding] not in encountered):
-            binding = bindings.get(binding)
-            encountered.append(binding)
+        chain = [self]
+        circular = False
+        while type(binding) is Var:
+            next_binding = get(binding)
+            if next_binding is None:
+                break
+            if type(next_binding) is Var and next_binding in chain:
+                circular = True
+                break
+            chain.append(binding)
+            binding = next_binding
+
+        # If we walked through more than one binding to reach the end of the
+        # chain, point each Var on the way directly at the end of the chain.
+        # The next lookup of any of them then takes a single step.  This is
+        # the *path compression* trick from union-find; it doesn't change
+        # what any Var is bound to, so it's safe to do on shared bindings.
+        # (We skip it when we stopped because of a circle.)
+        if len(chain) > 1 and not circular:
+            for var in chain:
+                bindings[var] = binding
 
         # If the next binding leads to a relation, expand it.
         if isinstance(binding, Relation):
@@ -223,10 +307,20 @@ class Var(object):
 class Relation(object):
 
     """A relationship (specified by a predicate) that holds between terms."""
+
+    __slots__ = ('pred', 'args', '_sig', '_vars', '_var_set')
     
     def __init__(self, pred, args):
         self.pred = pred
         self.args = args
+        self._sig = (pred, len(args)) # predicate and arity
+        self._vars = None # cached by get_vars
+        self._var_set = None # cached by var_set
+
+    # With __slots__ and no __dict__, pickle needs to be told how to rebuild a
+    # Relation; the cached values are simply computed again.
+    def __reduce__(self):
+        return (Relation, (self.pred, self.args))
         
     def __repr__(self):
         return '%s(%s)' % (self.pred, ', '.join(map(str, self.args)))
@@ -238,33 +332,78 @@ class Relation(object):
 
     def bind_vars(self, bindings):
         """Replace each Var in this relation with its bound term."""
+        # If none of our Vars are bound, there's nothing to replace.
+        if not any(var in bindings for var in self.var_set()):
+            return self
         bound = []
         for arg in self.args:
-            bound.append(arg.lookup(bindings) if arg in bindings else arg)
+            if type(arg) is Var and arg in bindings:
+                arg = arg.lookup(bindings)
+            bound.append(arg)
         return Relation(self.pred, bound)
 
     def rename_vars(self, replacements):
         """Recursively rename each Var in this relation."""
+        # A subtree that contains none of the replaced Vars would be rebuilt
+        # unchanged, so we can share it instead.
+        if self.var_set().isdisjoint(replacements):
+            return self
+        # Atoms never change and Vars are a single lookup, so only nested
+        # Relations need a method call.
         renamed = []
+        get = replacements.get
         for arg in self.args:
-            renamed.append(arg.rename_vars(replacements))
+            t = type(arg)
+            if t is Var:
+                arg = get(arg, arg)
+            elif t is Relation:
+                arg = arg.rename_vars(replacements)
+            renamed.append(arg)
         return Relation(self.pred, renamed)
 
     def get_vars(self):
         """Return all Vars in this relation."""
-        vars = []
-        for arg in self.args:
-            vars.extend(v for v in arg.get_vars() if v not in vars)
-        return vars
+        # Relations aren't modified once they're built, so we only need to
+        # collect the Vars the first time we're asked for them.
+        if self._vars is None:
+            # Relations can be nested deeply (think of a long list built from
+            # `pair` relations), so we walk the tree with an explicit stack
+            # rather than recursing.  Arguments are pushed in reverse so that
+            # the Vars come out in the order they appear.
+            vars, seen = [], set()
+            stack = list(reversed(self.args))
+            while stack:
+                arg = stack.pop()
+                if isinstance(arg, Var):
+                    if arg not in seen:
+                        seen.add(arg)
+                        vars.append(arg)
+                elif isinstance(arg, Relation):
+                    stack.extend(reversed(arg.args))
+            self._vars = tuple(vars)
+        return list(self._vars)
+
+    def var_set(self):
+        """Return the set of all Vars in this relation."""
+        if self._var_set is None:
+            self._var_set = frozenset(self.get_vars())
+        return self._var_set
 
 
 class Clause(object):
 
     """A clause with a head relation and some body relations."""
+
+    __slots__ = ('head', 'body', '_key', '_vars')
     
     def __init__(self, head, body=None):
         self.head = head
         self.body = body or []
+        self._key = None # cached by head_key
+        self._vars = None # cached by get_vars
+
+    def __reduce__(self):
+        return (Clause, (self.head, self.body))
 
     def __repr__(self):
         if self.body:
@@ -292,16 +431,30 @@ class Clause(object):
 
     def recursive_rename(self):
         """Replace each var in self with an unused one."""
-        renames = {v: Var.get_unused_var() for v in self.get_vars()}
-        logging.debug('Renamed vars: %s' % renames)
+        vars = self.get_vars()
+        if not vars:
+            # There's nothing to collide with, so the clause can be shared.
+            return self
+        renames = dict(zip(vars, Var.get_unused_vars(len(vars))))
+        logging.debug('Renamed vars: %s', renames)
         return self.rename_vars(renames)
 
+    def head_key(self):
+        """Return the index key (see `index_key`) of this clause's head."""
+        if self._key is None:
+            self._key = index_key(self.head, {})
+        return self._key
+
     def get_vars(self):
         """Return a list of all Vars in this Clause."""
-        vars = self.head.get_vars()
-        for rel in self.body:
-            vars.extend(v for v in rel.get_vars() if v not in vars)
-        return vars
+        # Every clause in the database is renamed each time it's used to prove
+        # a goal, and renaming needs its Vars, so we only collect them once.
+        if self._vars is None:
+            vars = self.head.get_vars()
+            for rel in self.body:
+                vars.extend(v for v in rel.get_vars() if v not in vars)
+            self._vars = tuple(vars)
+        return list(self._vars)
 
 
 # ----------------------------------------------------------------------------
@@ -337,6 +490,43 @@ def define_procedure(db, name, proc):
     """Store a Python function in the database with the given name."""
     db[name] = proc
 
+# Retrieving clauses by predicate narrows things down quite a bit, but a
+# predicate like `parent` in a family tree might have dozens of facts, and only
+# a few of them can possibly match a goal like `parent(charles1, ?p)`.  Like
+# most Prolog implementations, we can also look at the first argument: if the
+# first arguments of a goal and of a clause's head are different atoms, or
+# relations with different predicates, then the two can never unify and we can
+# skip the clause without trying.
+
+def index_key(relation, bindings):
+    """
+    Summarize relation so that clauses that can't match it can be skipped.
+
+    Returns a tuple (arity, first), where first describes the relation's first
+    argument (after following its bindings), or is None if it could be anything.
+    """
+    if not relation.args:
+        return 0, None
+    first = relation.args[0]
+    # Follow the bindings of the first argument to find out what it really is.
+    # (There can be no more steps than bindings, even if they form a circle.)
+    for _ in xrange(len(bindings)):
+        if not isinstance(first, Var) or first not in bindings:
+            break
+        first = bindings[first]
+    if isinstance(first, Atom):
+        return len(relation.args), ('atom', first.atom)
+    if isinstance(first, Relation):
+        return len(relation.args), ('relation', first.pred, len(first.args))
+    return len(relation.args), None
+
+def may_unify(key1, key2):
+    """Can relations with index keys key1 and key2 possibly be unified?"""
+    arity1, first1 = key1
+    arity2, first2 = key2
+    return arity1 == arity2 and (first1 is None or first2 is None
+                                 or first1 == first2)
+
 
 # ----------------------------------------------------------------------------
 # <a id="unification"></a>
@@ -380,70 +570,88 @@ def define_procedure(db, name, proc):
 # ----------------------------------------------------------------------------
 
 def unify(x, y, bindings):
-    """Unify x and y, if possible.  Returns updated bindings or None."""
-    logging.debug('Unify %s and %s (bindings=%s)' % (x, y, bindings))
-
+    """Unify x and y, if possible.  Returns updated bindings or False."""
     # False bindings means we failed in a previous step.  Re-fail.
     if bindings == False:
         return False
 
-    # Make a copy of bindings so we can backtrack if necessary.
+    # Make a copy of bindings so we can backtrack if necessary.  We only need
+    # one copy for the whole unification: if it fails partway through, we throw
+    # the copy away, and the caller's bindings are untouched.
     bindings = dict(bindings)
-
-    # When x and y are equal (the same Var or Atom), there's nothing to do.
-    if x == y:
+    if unify_in_place(x, y, bindings):
         return bindings
+    return False
+
+def unify_in_place(x, y, bindings):
+    """
+    Unify x and y, if possible, adding any new bindings directly to bindings.
+    Returns True if successful and False otherwise.
+    """
+    logging.debug('Unify %s and %s (bindings=%s)', x, y, bindings)
+
+    # When x and y are the same object, there's nothing to do.  Since Atoms and
+    # Vars are interned, this catches equal Vars and most equal Atoms with a
+    # single comparison.  (We don't compare Relations for equality here: that
+    # would walk both of them, only for us to walk them again below.)
+    if x is y:
+        return True
+
+    # What to do next depends on the types of x and y.  Unification happens
+    # constantly while proving goals, so we find the types once and compare
+    # them directly rather than calling `isinstance` over and over.
+    tx, ty = type(x), type(y)
 
     #### Unification of Vars with anything else
-    if isinstance(x, Var):
+    if tx is Var:
         # If x (or y) is already bound to something, dereference and try again.
-        if x in bindings:
-            return unify(bindings[x], y, bindings)
-        if y in bindings:
-            return unify(x, bindings[y], bindings)
-
-        # Otherwise, bind x to y.
+        # Only Vars are ever bound, so there's no need to look y up otherwise.
+        binding = bindings.get(x)
+        if binding is not None:
+            return unify_in_place(binding, y, bindings)
+        if ty is Var:
+            binding = bindings.get(y)
+            if binding is not None:
+                return unify_in_place(x, binding, bindings)
+
+        # Otherwise, bind x to y.  Like Prolog (and PAIP), we don't check
+        # whether x occurs inside y, so binding a fresh Var costs nothing more
+        # than a dictionary insertion.
         bindings[x] = y
-        return bindings
-    if isinstance(y, Var):
-        return unify(y, x, bindings)
+        return True
+    if ty is Var:
+        return unify_in_place(y, x, bindings)
 
     #### Unification of Relations with Relations
-    if isinstance(x, Relation) and isinstance(y, Relation):
+    if tx is Relation and ty is Relation:
         # Two relations must have the same predicate and arity to unify.
-        if x.pred != y.pred:
-            return False
-        if len(x.args) != len(y.args):
+        if x._sig != y._sig:
             return False
 
-        # Unify corresponding terms in the relations.
-        for i, xi in enumerate(x.args):
-            yi = y.args[i]
-            bindings = unify(xi, yi, bindings)
-            if bindings == False:
+        # Unify corresponding terms in the relations.  Their arities match, so
+        # zip pairs up every term.
+        for xi, yi in zip(x.args, y.args):
+            if not unify_in_place(xi, yi, bindings):
                 return False
 
-        return bindings
+        return True
 
     #### Unification of Clauses with Clauses
-    if isinstance(x, Clause) and isinstance(y, Clause):
+    if tx is Clause and ty is Clause:
         # Clause bodies must have the same length to unify.
         if len(x.body) != len(y.body):
             return False
 
         # Unify head term and body terms.
-        bindings = unify(x.head, y.head, bindings)
-        if bindings == False:
+        if not unify_in_place(x.head, y.head, bindings):
             return False
-        for i, xi in enumerate(x.body):
-            yi = y.body[i]
-            bindings = unify(xi, yi, bindings)
-            if bindings == False:
+        for xi, yi in zip(x.body, y.body):
+            if not unify_in_place(xi, yi, bindings):
                 return False
-        return bindings
+        return True
 
-    #### Nothing else can unify.
-    return False
+    #### Nothing else can unify unless it's equal.
+    return x == y
 
 
 # ----------------------------------------------------------------------------
@@ -497,39 +705,52 @@ def unify(x, y, bindings):
 # We will keep track of the goals we're proving with a stack, implemented as a
 # Python list.  In this way we can keep track of all the goals we must prove
 # even when we recurse while proving.
+#
+# Rather than returning the first bindings that satisfy the goals, we write the
+# prover as a Python *generator* that yields each set of satisfying bindings in
+# turn.  No work is done to find a solution until it's asked for, so a caller
+# that only needs the first solution pays for exactly that, and a caller that
+# wants all of them can simply loop.
 
 # ----------------------------------------------------------------------------
 
-def prove(goal, bindings, db, remaining=None):
+def prove_iter(goal, bindings, db, remaining=None, start=0):
     """
     Prove goal and all remaining goals using the given bindings and database.
 
-    If successful, returns the extended bindings that satisfy all the goals.
-    Otherwise, returns False.
+    Only the goals in remaining from index start on are still to be proved.
+    Yields each set of extended bindings that satisfies all the goals.
     """
 
     # False bindings means we failed somewhere earlier, so re-fail.
     if bindings == False:
-        return False
+        return
     
-    logging.debug('Prove %s (bindings=%s)' % (goal, bindings))
+    logging.debug('Prove %s (bindings=%s)', goal, bindings)
     remaining = remaining or []
     
     # Find the clauses in the database that might help us prove goal.
     query = db.get(goal.pred)
     if not query:
-        return False
+        return
     
     if not isinstance(query, list):
         # If the retrieved data from the database isn't a list of clauses,
         # it must be a Python function--call it and return the results.
-        return query(goal.args, bindings, db, remaining)
+        result = query(goal.args, bindings, db, remaining[start:])
+        if result != False:
+            yield result
+        return
 
-    logging.debug('Candidate clauses: %s' % query)
+    logging.debug('Candidate clauses: %s', query)
+    key = index_key(goal, bindings)
 
     # Try to use the retrieved clauses to prove the goal.
     for clause in query:
-        logging.debug('Trying candidate clause %s for goal %s' % (clause, goal))
+        # Don't bother with clauses that can't possibly unify with goal.
+        if not may_unify(key, clause.head_key()):
+            continue
+        logging.debug('Trying candidate clause %s for goal %s', clause, goal)
         
         # First, rename the variables in clause so they don't collide with
         # those in goal.
@@ -542,6 +763,14 @@ def prove(goal, bindings, db, remaining=None):
         if unified == False:
             continue
 
+        # A fact has no subgoals and can't lead to a loop, so there's no need
+        # to bind its variables; it's proved, and we go on to the remaining
+        # goals.
+        if not renamed.body:
+            for extended in prove_all_iter(remaining, unified, db, start):
+                yield extended
+            continue
+
         # Make sure the candidate clause doesn't lead to an infinite loop
         # by checking to see if its head is in its body.
         renamed = renamed.bind_vars(unified)
@@ -550,28 +779,45 @@ def prove(goal, bindings, db, remaining=None):
 
         # We need to prove the subgoals of the candidate clause before
         # using it to prove goal.  Then prove the remaining goals as well.
-        extended = prove_all(renamed.body + remaining, unified, db)
-        
-        # If we can't prove all the subgoals, or the bindings that result from
-        # proving the subgoals make it so that the remaining goals can't be
-        # proved, move on.
-        if extended == False:
-            continue
+        # Every way of doing so is a solution; if there are none (the
+        # subgoals can't be proved, or the bindings that result from proving
+        # them make it so that the remaining goals can't be proved), we
+        # simply move on to the next clause.  The body and the remaining goals
+        # go on one list, so that a primitive in the body is handed every goal
+        # left to prove and not just the rest of the body.
+        goals = list(renamed.body) + remaining[start:]
+        for extended in prove_all_iter(goals, unified, db):
+            yield extended
+
+    logging.debug('No more ways to prove %s', goal)
+    
+def prove_all_iter(goals, bindings, db, start=0):
+    """Yield bindings that prove the goals from index start on."""
+    if bindings == False:
+        return
+    if start == len(goals):
+        yield bindings
+        return
+    logging.debug('Proving goals: %s from %d (bindings=%s)',
+                  goals, start, bindings)
+    for extended in prove_iter(goals[start], bindings, db, goals, start + 1):
+        yield extended
+
+# Usually we're only interested in whether a goal can be proved at all, and so
+# in the first solution.
 
-        # Otherwise return the bindings that satisfied the goals.
-        return extended
+def prove(goal, bindings, db, remaining=None):
+    """
+    Prove goal and all remaining goals using the given bindings and database.
+
+    If successful, returns the extended bindings that satisfy all the goals.
+    Otherwise, returns False.
+    """
+    return next(prove_iter(goal, bindings, db, remaining), False)
 
-    logging.debug('Failed to prove %s' % goal)
-    return False
-    
 def prove_all(goals, bindings, db):
     """Prove all the goals with the given bindings and rule database."""
-    if bindings == False:
-        return False
-    if not goals:
-        return bindings
-    logging.debug('Proving goals: %s (bindings=%s)' % (goals, bindings))
-    return prove(goals[0], bindings, db, goals[1:])
+    return next(prove_all_iter(goals, bindings, db), False)
 
 # ----------------------------------------------------------------------------
 
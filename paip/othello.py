@@ -90,19 +90,27 @@ UP, DOWN, LEFT, RIGHT = -10, 10, -1, 1
 UP_RIGHT, DOWN_RIGHT, DOWN_LEFT, UP_LEFT = -9, 11, 9, -11
 DIRECTIONS = (UP, UP_RIGHT, RIGHT, DOWN_RIGHT, DOWN, DOWN_LEFT, LEFT, UP_LEFT)
 
+# The valid squares never change, so we only need to list them once.
+SQUARES = tuple(i for i in xrange(11, 89) if 1 <= (i % 10) <= 8)
+
+# For checking whether an index is one of them, we also keep a flag for each
+# index: VALID_MASK[i] is 1 if i is a square on the board and 0 otherwise.
+VALID_MASK = bytearray(1 if i in SQUARES else 0 for i in xrange(100))
+
 def squares():
     """List all the valid squares on the board."""
-    return [i for i in xrange(11, 89) if 1 <= (i % 10) <= 8]
+    return SQUARES
+
+# Every game starts from the same board: the middle four squares hold the
+# initial piece positions, the rest of the squares are empty, and everything
+# else is the outside edge.  We set it up once and hand out copies.
+START = {44: WHITE, 45: BLACK, 54: BLACK, 55: WHITE}
+INITIAL_BOARD = tuple(START.get(i, EMPTY) if VALID_MASK[i] else OUTER
+                      for i in xrange(100))
 
 def initial_board():
     """Create a new board with the initial black and white positions filled."""
-    board = [OUTER] * 100
-    for i in squares():
-        board[i] = EMPTY
-    # The middle four squares should hold the initial piece positions.
-    board[44], board[45] = WHITE, BLACK
-    board[54], board[55] = BLACK, WHITE
-    return board
+    return list(INITIAL_BOARD)
 
 def print_board(board):
     """Get a string representation of the board."""
@@ -129,24 +137,42 @@ def print_board(board):
 
 def is_valid(move):
     """Is move a square on the board?"""
-    return isinstance(move, int) and move in squares()
+    return isinstance(move, int) and 0 <= move < 100 and VALID_MASK[move] == 1
 
 def opponent(player):
     """Get player's opponent piece."""
     return BLACK if player is WHITE else WHITE
 
+# Looking for a bracket means walking from a square in some direction until we
+# leave the board.  The squares along each of these walks never change, so we
+# list them ahead of time: `RAYS[direction][square]` holds the squares reached
+# by walking from `square` in `direction`.
+
+def ray(square, direction):
+    """List the squares on the board reached by walking from square."""
+    path = []
+    square += direction
+    while is_valid(square):
+        path.append(square)
+        square += direction
+    return tuple(path)
+
+RAYS = dict((d, [ray(sq, d) for sq in xrange(100)]) for d in DIRECTIONS)
+
 def find_bracket(square, player, board, direction):
     """
     Find a square that forms a bracket with `square` for `player` in the given
     `direction`.  Returns None if no such square exists.
     """
-    bracket = square + direction
-    if board[bracket] == player:
-        return None
     opp = opponent(player)
-    while board[bracket] == opp:
-        bracket += direction
-    return None if board[bracket] in (OUTER, EMPTY) else bracket
+    for bracket in RAYS[direction][square]:
+        piece = board[bracket]
+        if piece != opp:
+            # A bracket needs at least one of opp's pieces before player's.
+            if piece == player and bracket != square + direction:
+                return bracket
+            return None
+    return None
 
 def is_legal(move, player, board):
     """Is this a legal move for the player?"""
@@ -186,13 +212,52 @@ class IllegalMoveError(Exception):
     def __str__(self):
         return '%s cannot move to square %d' % (PLAYERS[self.player], self.move)
 
+# Finding the legal moves happens for every board a strategy considers, and
+# checking whether a player can move at all happens after every move.  Calling
+# `is_legal` on each square means walking out in all eight directions from
+# every one of them.  Instead we can find all of a player's moves at once
+# using *bitboards*: integers whose bit `sq` is set when square `sq` holds a
+# certain kind of piece.  We keep the same indexing as the board, so the edge
+# squares belong to no bitboard and a ray stops there just like it does in
+# `find_bracket`.
+
+def bitboards(player, board):
+    """Get bitboards of player's pieces, opponent's pieces, and empty squares."""
+    own, opp, empty = 0, 0, 0
+    theirs = opponent(player)
+    for sq in squares():
+        piece = board[sq]
+        if piece == player: own |= 1 << sq
+        elif piece == theirs: opp |= 1 << sq
+        elif piece == EMPTY: empty |= 1 << sq
+    return own, opp, empty
+
+def shift(bits, direction):
+    """Move each square in a bitboard one step in the given direction."""
+    return bits << direction if direction > 0 else bits >> -direction
+
+def legal_move_bits(player, board):
+    """Get a bitboard of all the legal moves for player."""
+    own, opp, empty = bitboards(player, board)
+    moves = 0
+    for d in DIRECTIONS:
+        # Step off each of player's pieces onto the opponent's and follow the
+        # runs; an empty square at the end of a run brackets it.
+        run = shift(own, d) & opp
+        while run:
+            run = shift(run, d)
+            moves |= run & empty
+            run &= opp
+    return moves
+
 def legal_moves(player, board):
     """Get a list of all legal moves for player."""
-    return [sq for sq in squares() if is_legal(sq, player, board)]
+    moves = legal_move_bits(player, board)
+    return [sq for sq in squares() if moves >> sq & 1]
 
 def any_legal_move(player, board):
     """Can player make any moves?"""
-    return any(is_legal(sq, player, board) for sq in squares())
+    return legal_move_bits(player, board) != 0
 
 ### Putting it all together
 
@@ -232,13 +297,9 @@ def get_move(strategy, player, board):
 
 def score(player, board):
     """Compute player's score (number of player's pieces minus opponent's)."""
-    mine, theirs = 0, 0
-    opp = opponent(player)
-    for sq in squares():
-        piece = board[sq]
-        if piece == player: mine += 1
-        elif piece == opp: theirs += 1
-    return mine - theirs
+    # Only the outside edge lies off the board, and it never holds a piece, so
+    # we can let the list count the pieces for us.
+    return board.count(player) - board.count(opponent(player))
 
 
 # -----------------------------------------------------------------------------
@@ -310,9 +371,10 @@ def weighted_score(player, board):
     opp = opponent(player)
     total = 0
     for sq in squares():
-        if board[sq] == player:
+        piece = board[sq]
+        if piece == player:
             total += SQUARE_WEIGHTS[sq]
-        elif board[sq] == opp:
+        elif piece == opp:
             total -= SQUARE_WEIGHTS[sq]
     return total
 
@@ -323,17 +385,28 @@ def weighted_score(player, board):
 # the implications of a move several turns in advance could have a significant
 # advantage.  The **minimax** algorithm does just that.
 
-def minimax(player, board, depth, evaluate):
+def minimax(player, board, depth, evaluate, cache=None):
     """
     Find the best legal move for player, searching to the specified depth.
     Returns a tuple (move, min_score), where min_score is the guaranteed minimum
     score achievable for player if the move is made.
+
+    If a dictionary is passed as `cache`, the values of the boards searched are
+    stored in it and reused when the same board is reached again.
     """
 
     # We define the value of a board to be the opposite of its value to our
     # opponent, computed by recursively applying `minimax` for our opponent.
     def value(board):
-        return -minimax(opponent(player), board, depth-1, evaluate)[0]
+        opp = opponent(player)
+        if cache is None:
+            return -minimax(opp, board, depth-1, evaluate)[0]
+        # Different sequences of moves often lead to the same board (a
+        # *transposition*), and there's no need to search it more than once.
+        key = (''.join(board), opp, depth-1)
+        if key not in cache:
+            cache[key] = minimax(opp, board, depth-1, evaluate, cache)[0]
+        return -cache[key]
     
     # When depth is zero, don't examine possible moves--just determine the value
     # of this board to the player.
@@ -375,7 +448,9 @@ def minimax_searcher(depth, evaluate):
     evaluation function.
     """
     def strategy(player, board):
-        return minimax(player, board, depth, evaluate)[1]
+        # Boards searched for one move are mostly unreachable by the next, so
+        # each search gets a fresh cache.
+        return minimax(player, board, depth, evaluate, {})[1]
     return strategy
 
 # <a id="alphabeta"></a>
@@ -402,49 +477,143 @@ def minimax_searcher(depth, evaluate):
 # we can quit searching this subtree since the opponent can prevent us from
 # playing it.
 
-def alphabeta(player, board, alpha, beta, depth, evaluate):
+def alphabeta(player, board, alpha, beta, depth, evaluate, cache=None,
+              killers=None):
     """
     Find the best legal move for player, searching to the specified depth.  Like
-    minimax, but uses the bounds alpha and beta to prune branches.
+    minimax, but uses the bounds alpha and beta to prune branches.  A `cache`
+    is used through `cached_alphabeta`, and `killers` is described below.
     """
     if depth == 0:
         return evaluate(player, board), None
 
-    def value(board, alpha, beta):
-        # Like in `minimax`, the value of a board is the opposite of its value
-        # to the opponent.  We pass in `-beta` and `-alpha` as the alpha and
-        # beta values, respectively, for the opponent, since `alpha` represents
-        # the best score we know we can achieve and is therefore the worst score
-        # achievable by the opponent.  Similarly, `beta` is the worst score that
-        # our opponent can hold us to, so it is the best score that they can
-        # achieve.
-        return -alphabeta(opponent(player), board, -beta, -alpha, depth-1, evaluate)[0]
-    
+    # Like in `minimax`, the value of a board is the opposite of its value to
+    # the opponent.  We pass in `-beta` and `-alpha` as the alpha and beta
+    # values, respectively, for the opponent, since `alpha` represents the best
+    # score we know we can achieve and is therefore the worst score achievable
+    # by the opponent.  Similarly, `beta` is the worst score that our opponent
+    # can hold us to, so it is the best score that they can achieve.
+    opp = opponent(player)
     moves = legal_moves(player, board)
     if not moves:
-        if not any_legal_move(opponent(player), board):
+        if not any_legal_move(opp, board):
             return final_value(player, board), None
-        return value(board, alpha, beta), None
+        return -alphabeta(opp, board, -beta, -alpha, depth-1, evaluate,
+                          cache, killers)[0], None
     
+    # Alpha-beta prunes the most when it looks at the best moves first.  When
+    # there's enough search left below this board for it to pay off, we make
+    # every move up front and try them in order of `weighted_score`, which is a
+    # cheap guess at how good they are.  Otherwise we make each move only when
+    # we get to it, since we may stop looking before then.
+    #
+    # A move that let us prune a board elsewhere at the same depth will often
+    # let us prune this one too.  If we're given a dictionary of these *killer
+    # moves*, kept by depth, we try them before anything else.
+    killer_moves = killers.get(depth) if killers is not None else None
+    if depth >= 2:
+        children = [(m, make_move(m, player, list(board))) for m in moves]
+        children.sort(key=lambda child: -weighted_score(player, child[1]))
+        if killer_moves:
+            children.sort(key=lambda child: child[0] not in killer_moves)
+    else:
+        if killer_moves:
+            moves = sorted(moves, key=lambda m: m not in killer_moves)
+        children = ((m, make_move(m, player, list(board))) for m in moves)
+
+    # Every board in the search tree passes through this loop, so we search the
+    # opponent's replies right here instead of in a helper function, which would
+    # cost an extra function call per board.
     best_move = moves[0]
-    for move in moves:
+    for move, child in children:
         if alpha >= beta:
             # If one of the legal moves leads to a better score than beta, then
             # the opponent will avoid this branch, so we can quit looking.
             break
-        val = value(make_move(move, player, list(board)), alpha, beta)
+        if cache is None:
+            val = -alphabeta(opp, child, -beta, -alpha, depth-1, evaluate,
+                             None, killers)[0]
+        else:
+            val = -cached_alphabeta(opp, child, -beta, -alpha, depth-1,
+                                    evaluate, cache, killers)
         if val > alpha:
             # If one of the moves leads to a better score than the current best
             # achievable score, then replace it with this one.
             alpha = val
             best_move = move
+            if alpha >= beta and killers is not None:
+                # Remember the two most recent killers at each depth.
+                killer_moves = killers.setdefault(depth, [])
+                if move not in killer_moves:
+                    killer_moves.insert(0, move)
+                    del killer_moves[2:]
     return alpha, best_move
 
+# A pruned search only tells us a board's exact value when it lands between
+# alpha and beta.  Otherwise it tells us a bound: a value at or below alpha is
+# as high as the board can be worth, and one at or above beta is as low.  So
+# each cached value is stored with which of these it is, and it's used again
+# whenever it's enough to settle the board for the bounds being searched with.
+EXACT, UPPER, LOWER = range(3)
+
+def cached_alphabeta(player, board, alpha, beta, depth, evaluate, cache,
+                     killers=None):
+    """
+    Return the `alphabeta` value of board for player, using and updating the
+    `(value, bound)` entries in `cache`.
+    """
+    key = (''.join(board), player, depth)
+    entry = cache.get(key)
+    if entry is not None:
+        value, bound = entry
+        if (bound == EXACT or (bound == LOWER and value >= beta) or
+            (bound == UPPER and value <= alpha)):
+            return value
+    value = alphabeta(player, board, alpha, beta, depth, evaluate, cache,
+                      killers)[0]
+    if value <= alpha:
+        cache[key] = (value, UPPER)
+    elif value >= beta:
+        cache[key] = (value, LOWER)
+    else:
+        cache[key] = (value, EXACT)
+    return value
+
+# Few boards come up twice in a single search at the depths we play at, so
+# building a key for every board costs more than the cache saves, and the
+# strategy doesn't use one.
+
 def alphabeta_searcher(depth, evaluate):
     def strategy(player, board):
         return alphabeta(player, board, MIN_VALUE, MAX_VALUE, depth, evaluate)[1]
     return strategy
 
+# Killer moves are most useful with *iterative deepening*: rather than going
+# straight to the full depth, we search to depth 1, then 2, and so on.  The
+# shallow searches are cheap next to the last one, and they leave behind the
+# killer moves (and the best move at the top) for the deeper searches to try
+# first.
+
+def iterative_alphabeta(player, board, depth, evaluate):
+    """
+    Find the best legal move for player like `alphabeta`, but by searching to
+    each depth from 1 up to the specified depth in turn.
+    """
+    killers = {}
+    for d in xrange(1, depth):
+        move = alphabeta(player, board, MIN_VALUE, MAX_VALUE, d, evaluate,
+                         None, killers)[1]
+        # The best move so far is the first one to try in the next search.
+        if move is not None:
+            killers[d+1] = [move]
+    return alphabeta(player, board, MIN_VALUE, MAX_VALUE, depth, evaluate,
+                     None, killers)
+
+def iterative_alphabeta_searcher(depth, evaluate):
+    def strategy(player, board):
+        return iterative_alphabeta(player, board, depth, evaluate)[1]
+    return strategy
+
 
 # -----------------------------------------------------------------------------
 # <a id="conclusion"></a>
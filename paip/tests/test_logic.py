@@ -1,9 +1,41 @@
+import copy
 import logging
+import pickle
 import unittest
 from paip import logic
 
 
+class AtomTests(unittest.TestCase):
+    def test_interned(self):
+        self.assertTrue(logic.Atom('a') is logic.Atom('a'))
+        self.assertFalse(logic.Atom('a') is logic.Atom('b'))
+
+    def test_interned_by_type(self):
+        self.assertEqual(1, logic.Atom(1).atom)
+        self.assertEqual(float, type(logic.Atom(1.0).atom))
+        # Different types are kept apart, but equal literals still unify.
+        self.assertFalse(logic.Atom(1) is logic.Atom(1.0))
+        self.assertEqual(logic.Atom(1), logic.Atom(1.0))
+        self.assertEqual({}, logic.unify(logic.Atom(1), logic.Atom(1.0), {}))
+        self.assertEqual({}, logic.unify(logic.Atom('a'), logic.Atom(u'a'), {}))
+        self.assertFalse(logic.unify(logic.Atom(1), logic.Atom(2), {}))
+
+    def test_copy_interned(self):
+        a = logic.Atom('a')
+        self.assertTrue(copy.copy(a) is a)
+        self.assertTrue(copy.deepcopy(a) is a)
+
+
 class VarTests(unittest.TestCase):
+    def test_interned(self):
+        self.assertTrue(logic.Var('x') is logic.Var('x'))
+        self.assertNotEqual(logic.Var('x'), logic.Var('y'))
+
+    def test_copy_interned(self):
+        x = logic.Var('x')
+        self.assertTrue(copy.copy(x) is x)
+        self.assertTrue(copy.deepcopy(x) is x)
+
     def test_lookup_none(self):
         bindings = {}
         var = logic.Var('x')
@@ -27,6 +59,19 @@ class VarTests(unittest.TestCase):
         }
         self.assertEqual(w, x.lookup(bindings))
 
+    def test_lookup_compresses_path(self):
+        x = logic.Var('x')
+        y = logic.Var('y')
+        z = logic.Var('z')
+        w = logic.Atom('w')
+        bindings = {
+            x: y,
+            y: z,
+            z: w
+        }
+        x.lookup(bindings)
+        self.assertEqual({x: w, y: w, z: w}, bindings)
+
     def test_lookup_search_no_atom(self):
         x = logic.Var('x')
         y = logic.Var('y')
@@ -37,6 +82,13 @@ class VarTests(unittest.TestCase):
         }
         self.assertEqual(z, x.lookup(bindings))
 
+    def test_lookup_circular(self):
+        x = logic.Var('x')
+        y = logic.Var('y')
+        bindings = {x: y, y: x}
+        self.assertEqual(y, x.lookup(bindings))
+        self.assertEqual({x: y, y: x}, bindings)
+
     def test_rename_vars(self):
         v1 = logic.Var('x')
         begin = logic.Var.counter
@@ -45,12 +97,28 @@ class VarTests(unittest.TestCase):
         self.assertEqual(logic.Var('var%d' % begin), v2)
         self.assertEqual(begin + 1, logic.Var.counter)
 
+    def test_get_unused_vars(self):
+        begin = logic.Var.counter
+        vs = logic.Var.get_unused_vars(3)
+        self.assertEqual([logic.Var('var%d' % (begin + i)) for i in range(3)],
+                         vs)
+        self.assertEqual(begin + 3, logic.Var.counter)
+
     def test_get_vars(self):
         x = logic.Var('x')
         self.assertEqual([x], x.get_vars())
     
 
 class RelationTests(unittest.TestCase):
+    def test_deepcopy(self):
+        a = logic.Atom('a')
+        x = logic.Var('x')
+        rel = logic.Relation('likes', (a, logic.Relation('friend', (x,))))
+        copied = copy.deepcopy(rel)
+        self.assertEqual(rel, copied)
+        self.assertTrue(copied.args[0] is a)
+        self.assertEqual([x], copied.get_vars())
+
     def test_bind_vars(self):
         a = logic.Atom('a')
         b = logic.Atom('b')
@@ -62,6 +130,14 @@ class RelationTests(unittest.TestCase):
         bindings = { x: b }
         self.assertEqual(s, r.bind_vars(bindings))
 
+    def test_bind_vars_identity_on_unbound(self):
+        a = logic.Atom('a')
+        b = logic.Atom('b')
+        x = logic.Var('x')
+        y = logic.Var('y')
+        r = logic.Relation('likes', (a, x))
+        self.assertTrue(r.bind_vars({y: b}) is r)
+
     def test_rename_vars(self):
         a = logic.Atom('a')
         x = logic.Var('x')
@@ -85,6 +161,24 @@ class RelationTests(unittest.TestCase):
         s = logic.Relation('likes', (y, y))
         self.assertEqual(s, r.rename_vars({x: y}))
 
+    def test_rename_vars_identity_on_disjoint(self):
+        a = logic.Atom('a')
+        x = logic.Var('x')
+        y = logic.Var('y')
+        z = logic.Var('z')
+        p2 = logic.Relation('pair', (a, y))
+        p1 = logic.Relation('pair', (x, p2))
+        self.assertTrue(p1.rename_vars({z: x}) is p1)
+        self.assertTrue(p1.rename_vars({x: z}).args[1] is p2)
+
+    def test_rename_vars_shares_atoms(self):
+        a = logic.Atom('a')
+        x = logic.Var('x')
+        z = logic.Var('z')
+        r = logic.Relation('likes', (a, x)).rename_vars({x: z})
+        self.assertTrue(r.args[0] is a)
+        self.assertTrue(r.args[1] is z)
+
     def test_get_vars(self):
         a = logic.Atom('a')
         x = logic.Var('x')
@@ -93,6 +187,15 @@ class RelationTests(unittest.TestCase):
         p2 = logic.Relation('pair', (a, p3))
         p1 = logic.Relation('pair', (y, p2))
         self.assertEqual(set([x, y]), set(p1.get_vars()))
+
+    def test_get_vars_in_order(self):
+        a = logic.Atom('a')
+        x = logic.Var('x')
+        y = logic.Var('y')
+        z = logic.Var('z')
+        p2 = logic.Relation('pair', (x, logic.Relation('pair', (z, a))))
+        p1 = logic.Relation('likes', (y, p2, x))
+        self.assertEqual([y, x, z], p1.get_vars())
         
 
 class ClauseTests(unittest.TestCase):
@@ -159,6 +262,11 @@ class ClauseTests(unittest.TestCase):
         self.assertTrue(y in bindings or y in bindings.values())
         self.assertTrue(z in bindings or z in bindings.values())
 
+    def test_recursive_rename_ground(self):
+        joe = logic.Atom('joe')
+        fact = logic.Clause(logic.Relation('likes', (joe, joe)))
+        self.assertTrue(fact.recursive_rename() is fact)
+
     def test_get_vars(self):
         a = logic.Atom('a')
         b = logic.Atom('b')
@@ -171,6 +279,54 @@ class ClauseTests(unittest.TestCase):
         c = logic.Clause(r, (s, t))
         self.assertEqual(set([x, y, z]), set(c.get_vars()))
 
+    def test_get_vars_returns_copy(self):
+        x = logic.Var('x')
+        y = logic.Var('y')
+        c = logic.Clause(logic.Relation('likes', (x, y)))
+        c.get_vars().append(logic.Var('z'))
+        c.head.get_vars().append(logic.Var('z'))
+        self.assertEqual([x, y], c.get_vars())
+        self.assertEqual([x, y], c.head.get_vars())
+
+    def test_pickle(self):
+        x = logic.Var('x')
+        clause = logic.Clause(logic.Relation('likes', (logic.Atom('joe'), x)),
+                              [logic.Relation('likes', (x, logic.Atom(1)))])
+        for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(clause, protocol))
+            self.assertEqual(clause, loaded)
+            self.assertEqual([x], loaded.get_vars())
+
+
+class IndexTests(unittest.TestCase):
+    def test_index_key_atom(self):
+        r = logic.Relation('likes', (logic.Atom('joe'), logic.Var('x')))
+        self.assertEqual((2, ('atom', 'joe')), logic.index_key(r, {}))
+
+    def test_index_key_relation(self):
+        p = logic.Relation('pair', (logic.Var('x'), logic.Atom('nil')))
+        r = logic.Relation('member', (p, logic.Var('y')))
+        self.assertEqual((2, ('relation', 'pair', 2)), logic.index_key(r, {}))
+
+    def test_index_key_unbound_var(self):
+        r = logic.Relation('likes', (logic.Var('x'), logic.Atom('joe')))
+        self.assertEqual((2, None), logic.index_key(r, {}))
+
+    def test_index_key_bound_var(self):
+        x = logic.Var('x')
+        y = logic.Var('y')
+        r = logic.Relation('likes', (x, logic.Atom('joe')))
+        bindings = {x: y, y: logic.Atom('judy')}
+        self.assertEqual((2, ('atom', 'judy')), logic.index_key(r, bindings))
+
+    def test_may_unify(self):
+        self.assertTrue(logic.may_unify((2, None), (2, ('atom', 'a'))))
+        self.assertTrue(logic.may_unify((2, ('atom', 'a')), (2, ('atom', 'a'))))
+        self.assertFalse(logic.may_unify((2, ('atom', 'a')), (2, ('atom', 'b'))))
+        self.assertFalse(logic.may_unify((1, None), (2, None)))
+        self.assertFalse(logic.may_unify((2, ('atom', 'a')),
+                                         (2, ('relation', 'a', 0))))
+
 
 class UnificationTests(unittest.TestCase):
     def test_atom_atom_ok(self):
@@ -341,6 +497,17 @@ class UnificationTests(unittest.TestCase):
         d = logic.Clause(t, [s, u])
         self.assertFalse(logic.unify(c, d, {}))
 
+    def test_failure_leaves_bindings_unchanged(self):
+        x = logic.Var('x')
+        y = logic.Var('y')
+        a = logic.Atom('a')
+        b = logic.Atom('b')
+        r = logic.Relation('likes', (x, y, a))
+        s = logic.Relation('likes', (a, b, b))
+        bindings = {}
+        self.assertFalse(logic.unify(r, s, bindings))
+        self.assertEqual({}, bindings)
+
     def test_clauses_ok(self):
         joe = logic.Atom('joe')
         judy = logic.Atom('judy')
@@ -374,6 +541,21 @@ class ProveTests(unittest.TestCase):
         bindings = logic.prove(goal, {}, db)
         self.assertFalse(bindings)
 
+    def test_prove_skips_clauses_that_cannot_match(self):
+        joe = logic.Atom('joe')
+        judy = logic.Atom('judy')
+        x = logic.Var('x')
+
+        db = {'likes': []}
+        db['likes'].append(logic.Clause(logic.Relation('likes', (joe, x)),
+                            [logic.Relation('likes', (x, joe))]))
+
+        begin = logic.Var.counter
+        goal = logic.Relation('likes', (judy, x))
+        self.assertFalse(logic.prove(goal, {}, db))
+        # The clause was never renamed, so it was never tried.
+        self.assertEqual(begin, logic.Var.counter)
+
     def test_prove_no_subgoals_required(self):
         joe = logic.Atom('joe')
         judy = logic.Atom('judy')
@@ -408,6 +590,49 @@ class ProveTests(unittest.TestCase):
         bindings = logic.prove_all([goal1, goal2], {}, db)
         self.assertEqual({x: jorge}, bindings)
 
+    def test_prove_all_iter_from_start(self):
+        joe = logic.Atom('joe')
+        judy = logic.Atom('judy')
+        x = logic.Var('x')
+
+        db = {'likes': [], 'hates': []}
+        db['hates'].append(logic.Clause(logic.Relation('hates', (judy, joe))))
+
+        # The first goal can't be proved, but it's skipped.
+        goals = [logic.Relation('likes', (x, joe)),
+                 logic.Relation('hates', (judy, x))]
+        self.assertEqual([], list(logic.prove_all_iter(goals, {}, db)))
+        self.assertEqual([{x: joe}], list(logic.prove_all_iter(goals, {}, db, 1)))
+
+    def test_prove_primitive_in_rule_body(self):
+        a = logic.Atom('a')
+        b = logic.Atom('b')
+        x = logic.Var('x')
+        y = logic.Var('y')
+
+        # A primitive that continues the proof with the goals it's handed.
+        seen = []
+        def trace(args, bindings, db, remaining):
+            seen.append([str(goal) for goal in remaining])
+            return logic.prove_all(remaining, bindings, db)
+
+        db = {'r': [], 'q': [], 's': []}
+        logic.define_procedure(db, 'trace', trace)
+        db['r'].append(logic.Clause(logic.Relation('r', (y,)),
+                                    [logic.Relation('trace', ()),
+                                     logic.Relation('q', (y,))]))
+        db['q'].append(logic.Clause(logic.Relation('q', (a,))))
+        db['q'].append(logic.Clause(logic.Relation('q', (b,))))
+        db['s'].append(logic.Clause(logic.Relation('s', (b,))))
+
+        # The primitive must see the outer goal too, or it can't backtrack
+        # past q(a) when s(a) fails.
+        goals = [logic.Relation('r', (x,)), logic.Relation('s', (x,))]
+        bindings = logic.prove_all(goals, {}, db)
+        self.assertEqual(b, x.lookup(bindings))
+        self.assertEqual(2, len(seen[0]))
+        self.assertEqual('s(?x)', seen[0][1])
+
     def test_prove_subgoals_required_fail(self):
         joe = logic.Atom('joe')
         judy = logic.Atom('judy')
@@ -442,6 +667,40 @@ class ProveTests(unittest.TestCase):
         bindings = logic.prove(goal, {}, db)
         self.assertEqual(jorge, x.lookup(bindings))
 
+    def test_prove_iter_all_solutions(self):
+        joe = logic.Atom('joe')
+        judy = logic.Atom('judy')
+        jorge = logic.Atom('jorge')
+        x = logic.Var('x')
+
+        db = {'likes': [], 'hates': []}
+        db['likes'].append(logic.Clause(logic.Relation('likes', (joe, x)),
+                            [logic.Relation('hates', (judy, x))]))
+        db['hates'].append(logic.Clause(logic.Relation('hates', (judy, jorge))))
+        db['hates'].append(logic.Clause(logic.Relation('hates', (judy, joe))))
+        db['hates'].append(logic.Clause(logic.Relation('hates', (joe, judy))))
+
+        goal = logic.Relation('likes', (joe, x))
+        solutions = [x.lookup(b) for b in logic.prove_iter(goal, {}, db)]
+        self.assertEqual([jorge, joe], solutions)
+
+    def test_prove_iter_lazy(self):
+        joe = logic.Atom('joe')
+        x = logic.Var('x')
+
+        db = {'likes': [], 'hates': []}
+        db['likes'].append(logic.Clause(logic.Relation('likes', (joe, joe))))
+        db['likes'].append(logic.Clause(logic.Relation('likes', (joe, x)),
+                            [logic.Relation('hates', (x, joe))]))
+
+        begin = logic.Var.counter
+        solutions = logic.prove_iter(logic.Relation('likes', (joe, x)), {}, db)
+        self.assertEqual(joe, x.lookup(next(solutions)))
+        # The second clause hasn't been tried (or renamed) yet.
+        self.assertEqual(begin, logic.Var.counter)
+        self.assertEqual([], list(solutions))
+        self.assertEqual(begin + 1, logic.Var.counter)
+
     def test_prove_primitive_call(self):
         joe = logic.Atom('joe')
         judy = logic.Atom('judy')
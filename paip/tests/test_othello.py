@@ -20,6 +20,11 @@ class MoveTests(unittest.TestCase):
         self.assertFalse(is_valid(124))
         self.assertFalse(is_valid('foo'))
 
+    def test_rays(self):
+        self.assertEqual((86, 87, 88), RAYS[RIGHT][85])
+        self.assertEqual((22, 11), RAYS[UP_LEFT][33])
+        self.assertEqual((), RAYS[UP][18])
+
     def test_find_bracketing_piece_none(self):
         square = 63
         self.assertEqual(None, find_bracket(63, WHITE, self.board, UP))
@@ -43,6 +48,14 @@ class MoveTests(unittest.TestCase):
     def test_is_legal(self):
         self.assertTrue(is_legal(42, BLACK, self.board))
 
+    def test_legal_moves(self):
+        for player in (BLACK, WHITE):
+            expected = [sq for sq in squares()
+                        if is_legal(sq, player, self.board)]
+            self.assertEqual(expected, legal_moves(player, self.board))
+            self.assertEqual(sum(1 << sq for sq in expected),
+                             legal_move_bits(player, self.board))
+
     def test_make_flips_none(self):
         b1, b2 = self.board, list(self.board)
         make_flips(42, WHITE, b2, RIGHT)
@@ -71,6 +84,13 @@ class GameTests(unittest.TestCase):
         self.board[11] = EMPTY
         self.board[88] = BLACK
     
+    def test_initial_board_is_fresh(self):
+        # setUp filled its board, but new boards still start from scratch.
+        board = initial_board()
+        self.assertEqual([WHITE, BLACK], board[44:46])
+        self.assertEqual([BLACK, WHITE], board[54:56])
+        self.assertEqual(60, board.count(EMPTY))
+
     def test_any_legal_move_false(self):
         self.assertFalse(any_legal_move(WHITE, self.board))
     
@@ -225,6 +245,71 @@ class StrategyTests(unittest.TestCase):
         self.assertEqual((MAX_VALUE, 71), minimax(WHITE, board, 20, evaluate))
         self.assertEqual(0, len(accesses))
 
+    def test_minimax_cache(self):
+        accesses = []
+        def evaluate(player, board):
+            accesses.append(player)
+            return weighted_score(player, board)
+        cache = {}
+        expected = minimax(BLACK, self.board, 2, weighted_score)
+        self.assertEqual(expected, minimax(BLACK, self.board, 2, evaluate, cache))
+        self.assertTrue(cache)
+        # Searching again finds every board in the cache.
+        del accesses[:]
+        self.assertEqual(expected, minimax(BLACK, self.board, 2, evaluate, cache))
+        self.assertEqual([], accesses)
+
+    def test_alphabeta_cache(self):
+        accesses = []
+        def evaluate(player, board):
+            accesses.append(player)
+            return weighted_score(player, board)
+        cache = {}
+        expected = alphabeta(BLACK, self.board, MIN_VALUE, MAX_VALUE, 3,
+                             weighted_score)
+        self.assertEqual(expected, alphabeta(BLACK, self.board, MIN_VALUE,
+                                             MAX_VALUE, 3, evaluate, cache))
+        for value, bound in cache.values():
+            self.assertTrue(bound in (EXACT, UPPER, LOWER))
+        # Searching again with the same bounds settles every board from the
+        # cache.
+        del accesses[:]
+        self.assertEqual(expected, alphabeta(BLACK, self.board, MIN_VALUE,
+                                             MAX_VALUE, 3, evaluate, cache))
+        self.assertEqual([], accesses)
+
+    def test_cached_alphabeta_bounds(self):
+        board = self.board
+        key = (''.join(board), BLACK, 2)
+        # A bound is only used when it settles the board for the window.
+        cache = {key: (50, LOWER)}
+        self.assertEqual(50, cached_alphabeta(BLACK, board, 0, 40, 2,
+                                              weighted_score, cache))
+        value = alphabeta(BLACK, board, MIN_VALUE, MAX_VALUE, 2,
+                          weighted_score)[0]
+        self.assertEqual(value, cached_alphabeta(BLACK, board, MIN_VALUE,
+                                                 MAX_VALUE, 2, weighted_score,
+                                                 cache))
+        self.assertEqual((value, EXACT), cache[key])
+
+    def test_alphabeta_killers(self):
+        expected = alphabeta(BLACK, self.board, MIN_VALUE, MAX_VALUE, 3,
+                             weighted_score)
+        killers = {}
+        self.assertEqual(expected[0], alphabeta(BLACK, self.board, MIN_VALUE,
+                                                MAX_VALUE, 3, weighted_score,
+                                                None, killers)[0])
+        self.assertTrue(killers)
+        for moves in killers.values():
+            self.assertTrue(1 <= len(moves) <= 2)
+
+    def test_iterative_alphabeta(self):
+        for depth in (1, 2, 3):
+            expected = alphabeta(WHITE, self.board, MIN_VALUE, MAX_VALUE, depth,
+                                 weighted_score)
+            self.assertEqual(expected[0], iterative_alphabeta(
+                WHITE, self.board, depth, weighted_score)[0])
+
     def test_alphabeta(self):
         board = initial_board()
         for sq in squares():
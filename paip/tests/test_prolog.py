@@ -0,0 +1,41 @@
+import unittest
+import prolog
+
+
+class LexerTests(unittest.TestCase):
+    def test_comment_without_newline(self):
+        self.assertEqual([], list(prolog.tokens('# only comment')))
+        self.assertEqual(None, prolog.parse('# only comment'))
+
+    def test_trailing_comment(self):
+        toks = list(prolog.tokens('<- x(y) # trailing comment'))
+        self.assertEqual([prolog.DEFN_BEGIN, prolog.IDENT, prolog.LPAREN,
+                          prolog.IDENT, prolog.RPAREN],
+                         [tt for tt, tok in toks])
+        self.assertEqual('x(y)', str(prolog.parse('<- x(y) # trailing comment')))
+
+    def test_crlf(self):
+        self.assertEqual([(prolog.IDENT, 'a')], list(prolog.tokens('a\r\n')))
+        self.assertEqual('a(b, c)', str(prolog.parse('<- a(b, c)\r\n')))
+
+
+class ErrorTests(unittest.TestCase):
+    def test_token_error_position(self):
+        line = '<- f(a) :- g(&)'
+        try:
+            prolog.parse(line)
+        except prolog.TokenError as e:
+            self.assertEqual(line, e.line)
+            self.assertEqual(13, e.pos)
+        else:
+            self.fail('expected a TokenError')
+
+    def test_parse_error_position(self):
+        line = '<- x(y'
+        try:
+            prolog.parse(line)
+        except prolog.ParseError as e:
+            self.assertEqual(line, e.line)
+            self.assertEqual(6, e.pos)
+        else:
+            self.fail('expected a ParseError')
@@ -1,11 +1,22 @@
 #! /usr/bin/env python
 
+from __future__ import print_function
+
 import argparse
+import collections
 import logging
 import sys
 
 from paip import logic
 
+# This file is written to compile under both Python 2 and 3, though it can't be
+# imported under Python 3 until paip.logic is ported.  The REPL reads lines with
+# input.
+try:
+    input = raw_input
+except NameError:
+    pass
+
 
 ## Parser and REPL
 
@@ -30,31 +41,42 @@ from paip import logic
 
 
 class ParseError(Exception):
-    def __init__(self, err):
+    def __init__(self, err, line=None, pos=None):
         self.err = err
+        # Where in which line the error was found, if known.
+        self.line = line
+        self.pos = pos
 
     def __str__(self):
         return 'Parse error: %s' % self.err
 
 
 class Parser(object):
-    k = 2
-
     def __init__(self, lexer):
         self.lexer = lexer
-        self.lookahead = []
-        for i in xrange(Parser.k):
-            self.lookahead.append(lexer.next())
+        # The grammar needs two tokens of lookahead (to tell a relation from an
+        # atom), so we keep exactly two, along with where each one starts.
+        self.la1 = lexer.next()
+        self.start1 = lexer.start
+        self.la2 = lexer.next()
+        self.start2 = lexer.start
 
     def la(self, i):
-        return self.lookahead[i-1]
+        return self.la1 if i == 1 else self.la2
+
+    def error(self, err):
+        """Make a ParseError pointing at the next token."""
+        return ParseError(err, self.lexer.line, self.start1)
 
     def match(self, exp_tt):
-        tt, tok = self.la(1)
+        tt, tok = self.la1
         if tt != exp_tt:
-            raise ParseError('Expected %s, got %s' % (exp_tt, tt))
-        self.lookahead.pop(0)
-        self.lookahead.append(self.lexer.next())
+            raise self.error('Expected %s, got %s' %
+                             (TOKEN_NAMES[exp_tt], TOKEN_NAMES[tt]))
+        self.la1 = self.la2
+        self.start1 = self.start2
+        self.la2 = self.lexer.next()
+        self.start2 = self.lexer.start
         return tok
 
     def command(self):
@@ -65,7 +87,7 @@ class Parser(object):
             return self.query()
         elif tt == DEFN_BEGIN:
             return self.defn()
-        raise ParseError('Unknown command: %s' % tok)
+        raise self.error('Unknown command: %s' % tok)
 
     def query(self):
         self.match(QUERY_BEGIN)
@@ -103,19 +125,17 @@ class Parser(object):
         return logic.Relation(pred, body)
 
     def term(self):
-        tt, tok = self.la(1)
-        if tt == QUESTION:
-            return self.var()
-        elif tt == NUM:
-            return self.atom()
-        elif tt == IDENT:
-            tt2, tok2 = self.la(2)
-            if tt2 == LPAREN:
+        tt, tok = self.la1
+        # Only an identifier needs the second token, to tell a relation from
+        # an atom; every other term is decided by its first token alone.
+        if tt == IDENT:
+            if self.la2[0] == LPAREN:
                 return self.relation()
-            else:
-                return self.atom()
-        else:
-            raise ParseError('Unknown term lookahead: %s' % tok)
+            return self.atom()
+        parse_term = TERM_PARSERS.get(tt)
+        if parse_term is None:
+            raise self.error('Unknown term lookahead: %s' % tok)
+        return parse_term(self)
 
     def var(self):
         self.match(QUESTION)
@@ -128,27 +148,40 @@ class Parser(object):
         elif tt == IDENT:
             return logic.Atom(self.match(IDENT))
         else:
-            raise ParseError('Unknown atom: %s' % tok)
+            raise self.error('Unknown atom: %s' % tok)
 
 
 class TokenError(Exception):
-    def __init__(self, err):
+    def __init__(self, err, line=None, pos=None):
         self.err = err
+        self.line = line
+        self.pos = pos
 
     def __str__(self):
         return 'Token error: %s' % self.err
 
 
-LPAREN = 'LPAREN'
-RPAREN = 'RPAREN'
-COMMA = 'COMMA'
-QUESTION = 'QUESTION'
-DEFN_BEGIN = 'DEFN_BEGIN'
-QUERY_BEGIN = 'QUERY_BEGIN'
-NUM = 'NUM'
-IDENT = 'IDENT'
-WHEN = 'WHEN'
-EOF = 'EOF'
+# Token types are small ints so that comparing them is cheap; their names are
+# only needed for error messages.  EOF also marks the end of the line in the
+# lexer, where it can never equal a character.
+TOKEN_NAMES = ('LPAREN', 'RPAREN', 'COMMA', 'QUESTION', 'DEFN_BEGIN',
+               'QUERY_BEGIN', 'NUM', 'IDENT', 'WHEN', 'EOF')
+(LPAREN, RPAREN, COMMA, QUESTION, DEFN_BEGIN,
+ QUERY_BEGIN, NUM, IDENT, WHEN, EOF) = range(len(TOKEN_NAMES))
+
+# Parsers for the terms that begin with something other than an identifier.
+TERM_PARSERS = {QUESTION: Parser.var, NUM: Parser.atom}
+
+# Tokens made of a single punctuation character.
+PUNCTUATION = {'(': LPAREN, ')': RPAREN, ',': COMMA}
+
+# Character classes used by the lexer.
+WHITESPACE = frozenset(' \t\r\n')
+DIGITS = frozenset('0123456789')
+NUM_START = DIGITS | frozenset('+-')
+LETTERS = frozenset('abcdefghijklmnopqrstuvwxyz'
+                    'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+IDENT_CHARS = LETTERS | DIGITS
 
 
 class Lexer(object):
@@ -156,6 +189,8 @@ class Lexer(object):
         self.line = line
         self.pos = 0
         self.ch = line[self.pos]
+        # The position of the last token returned by next.
+        self.start = 0
 
     def eat(self):
         ret = self.ch
@@ -166,37 +201,43 @@ class Lexer(object):
             self.ch = self.line[self.pos]
         return ret
 
+    def error(self, err):
+        """Make a TokenError pointing at the current character."""
+        return TokenError(err, self.line, self.pos)
+
     def match(self, exp):
         if self.ch != exp:
-            raise TokenError('expected %s' % exp)
+            raise self.error('expected %s' % exp)
         self.eat()
 
+    def scan(self, chars):
+        """Consume the run of characters in chars and return it."""
+        line = self.line
+        start = pos = self.pos
+        end = len(line)
+        while pos < end and line[pos] in chars:
+            pos += 1
+        self.pos = pos
+        self.ch = line[pos] if pos < end else EOF
+        return line[start:pos]
+
     def expect(self, is_type):
         if not is_type():
-            raise TokenError('expected type %s' % repr(is_type))
+            raise self.error('expected type %s' % repr(is_type))
 
-    def is_ws(self):
-        return self.ch in (' ', '\t', '\n')
-    
     def DEFN_BEGIN(self):
         self.match('<')
         self.match('-')
         return DEFN_BEGIN, '<-'
 
-    def is_when(self):
-        return self.ch == ':'
-
     def WHEN(self):
         self.match(':')
         self.match('-')
         return WHEN, ':-'
 
     def is_number(self):
-        return self.ch in '0123456789'
+        return self.ch in DIGITS
 
-    def is_num(self):
-        return self.is_number() or self.ch in ('+', '-')
-    
     def NUM(self):
         # get the leading sign
         sign = 1
@@ -207,10 +248,8 @@ class Lexer(object):
             self.eat()
 
         # read the whole part
-        num = ''
         self.expect(self.is_number)
-        while self.is_number():
-            num += self.eat()
+        num = self.scan(DIGITS)
 
         if not self.ch == '.':
             return NUM, int(num)
@@ -218,65 +257,64 @@ class Lexer(object):
 
         # read the fractional part
         self.expect(self.is_number)
-        while self.is_number():
-            num += self.eat()
+        num += self.scan(DIGITS)
         return NUM, float(num)
 
-    def is_ident(self):
-        letters = 'abcdefghijklmnopqrstuvwxyz'
-        return self.ch in letters or self.ch in letters.upper()
-
     def IDENT(self):
-        ident = ''
-        self.expect(self.is_ident)
-        while self.is_ident() or self.is_number():
-            ident += self.eat()
-        return IDENT, ident
+        return IDENT, self.scan(IDENT_CHARS)
 
     def comment(self):
         self.match('#')
-        while self.ch != '\n':
-            self.eat()
+        # Skip straight to the end of the line (which may have no newline).
+        nl = self.line.find('\n', self.pos)
+        if nl < 0:
+            self.pos = len(self.line)
+            self.ch = EOF
+        else:
+            self.pos = nl
+            self.ch = '\n'
     
     def next(self):
+        # Each token's first character is tested here directly, most common
+        # tokens first, so IDENT and NUM can assume they start on one of theirs.
         while self.pos < len(self.line):
-            if self.is_ws():
-                self.eat()
+            ch = self.ch
+            self.start = self.pos
+            if ch in WHITESPACE:
+                self.scan(WHITESPACE)
                 continue
-            if self.ch == '#':
-                self.comment()
-                continue
-            if self.ch == '<':
-                return self.DEFN_BEGIN()
-            if self.ch == '?':
+            if ch in LETTERS:
+                return self.IDENT()
+            if ch in PUNCTUATION:
+                return PUNCTUATION[ch], self.eat()
+            if ch in NUM_START:
+                return self.NUM()
+            if ch == '?':
                 self.eat()
                 if self.ch == '-':
                     self.eat()
                     return QUERY_BEGIN, '?-'
                 return QUESTION, '?'
-            if self.is_ident():
-                return self.IDENT()
-            if self.is_num():
-                return self.NUM()
-            if self.is_when():
+            if ch == '#':
+                self.comment()
+                continue
+            if ch == '<':
+                return self.DEFN_BEGIN()
+            if ch == ':':
                 return self.WHEN()
-            if self.ch == '(':
-                return LPAREN, self.eat()
-            if self.ch == ')':
-                return RPAREN, self.eat()
-            if self.ch == ',':
-                return COMMA, self.eat()
-            raise TokenError('no token begins with %s' % self.ch)
-        return EOF, EOF
+            raise self.error('no token begins with %s' % ch)
+        self.start = self.pos
+        return EOF, 'EOF'
     
 
 def tokens(line):
     lexer = Lexer(line)
     while True:
-        tokt, tok = lexer.next()
-        if tokt == EOF:
+        # The lexer's (type, token) pair is passed through as is.
+        token = lexer.next()
+        if token[0] == EOF:
             return
-        yield tokt, tok
+        yield token
 
 
 def parse(line):
@@ -285,26 +323,35 @@ def parse(line):
 
 
 def print_db(db):
-    print 'Database:'
-    longest = -1
-    for pred in db:
-        if len(pred) > longest:
-            longest = len(pred)
+    # The whole listing is built first and written out at once.
+    buf = ['Database:']
     for pred, items in db.items():
         if not isinstance(items, list):
             continue
-        print '%s:' % pred
-        for item in items:
-            print '\t', item
+        buf.append('%s:' % pred)
+        buf.extend('\t%s' % item for item in items)
+    buf.append('')
+    sys.stdout.write('\n'.join(buf))
 
 
 def read_db(db_file):
     db = {}
+    # Databases often repeat lines verbatim, so each distinct line is parsed
+    # only once.  Clauses are never modified after parsing (proving renames
+    # them first), so the cached ones can be stored more than once.
+    parsed = {}
+    # Clauses are gathered per predicate and added to the database at the end,
+    # in the order they were read.
+    clauses = collections.defaultdict(list)
     for line in db_file:
-        if line == '\n': continue
-        q = parse(line)
+        if not line.strip(): continue
+        if line not in parsed:
+            parsed[line] = parse(line)
+        q = parsed[line]
         if q:
-            logic.store(db, q)
+            clauses[q.head.pred].append(q)
+    for pred, cls in clauses.items():
+        db.setdefault(pred, []).extend(cls)
     return db
 
 
@@ -339,13 +386,23 @@ argparser.add_argument('--logging',
                        help='Enable logging',
                        dest='log')
 argparser.add_argument('--db',
-                       type=file,
+                       type=argparse.FileType('r'),
                        help='Database file',
                        dest='db_file')
 
 
+def print_error(e):
+    """Print a parse or token error with a caret under where it was found."""
+    print(e)
+    if e.line is not None:
+        # Tabs are kept so that the caret lines up with the echoed line.
+        margin = ''.join(c if c == '\t' else ' ' for c in e.line[:e.pos])
+        print(e.line.rstrip('\n'))
+        print(margin + '^')
+
+
 def main():
-    print 'Welcome to PyLogic.  Type "help" for help.'
+    print('Welcome to PyLogic.  Type "help" for help.')
     
     args = argparser.parse_args()
     db = read_db(args.db_file) if args.db_file else {}
@@ -355,7 +412,7 @@ def main():
     print_db(db)
     while True:
         try:
-            line = raw_input('>> ')
+            line = input('>> ')
         except EOFError:
             break
         if not line:
@@ -363,27 +420,24 @@ def main():
         if line == 'quit':
             break
         if line == 'help':
-            print help
+            print(help)
             continue
         try:
             q = parse(line)
-        except ParseError as e:
-            print e
-            continue
-        except TokenError as e:
-            print e
+        except (ParseError, TokenError) as e:
+            print_error(e)
             continue
 
         if isinstance(q, logic.Relation):
             try:
                 logic.prolog_prove([q], db)
             except KeyboardInterrupt:
-                print 'Cancelled.'
+                print('Cancelled.')
         elif isinstance(q, logic.Clause):
             logic.store(db, q)
             print_db(db)
 
-    print 'Goodbye.'
+    print('Goodbye.')
 
     
 if __name__ == '__main__':
@@ -1,7 +1,7 @@
 import argparse
+import importlib
 import logging
 import os
-import sys
 
 
 parser = argparse.ArgumentParser(description='Run example AI programs.')
@@ -10,12 +10,10 @@ parser.add_argument('--log', action='store_true', help='Turn on logging')
 
 def main():
     print 'Please choose an example to run:'
-    modules = []
-    for i, name in enumerate(discover_modules('paip/examples')):
-        __import__(name)
-        module = sys.modules[name]
-        modules.append(module)
-        print '%d\t%s' % (i, module.__name__)
+    # Only the chosen example is imported, since importing one runs its setup.
+    modules = discover_modules('paip/examples')
+    for i, (short, full) in enumerate(modules):
+        print '%d\t%s (%s)' % (i, short, full)
     while True:
         try:
             choice = raw_input('>> ')
@@ -29,22 +27,31 @@ def main():
             print 'Goodbye.'
             return
         try:
-            module = modules[ind]
+            short, full = modules[ind]
         except IndexError:
             print 'That is not a valid option.  Please try again.'
         else:
+            module = importlib.import_module(full)
             print module.__doc__
             return module.main()
 
 
 def discover_modules(root):
+    # Returns (short name, full module name) pairs, e.g. ('blocks',
+    # 'paip.examples.gps.blocks').  Files are told apart by name (sources, and
+    # the compiled files next to them), so only the other entries need to be
+    # checked for being directories.
     modules = []
-    for root, dirs, files in os.walk(root):
-        for f in (f for f in files if f.endswith('.py') and '__init__' not in f):
-            path = os.path.join(root, f)[:-3]
-            if root.startswith('.'):
-                path = path[2:]
-            modules.append(path.replace(os.sep, '.'))
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.endswith('.py'):
+            if name != '__init__.py':
+                path = os.path.normpath(path)[:-3]
+                modules.append((name[:-3], path.replace(os.sep, '.')))
+        elif name.endswith(('.pyc', '.pyo')):
+            continue
+        elif os.path.isdir(path):
+            modules.extend(discover_modules(path))
     return modules
 
 
@@ -1,16 +1,20 @@
+import glob
+import importlib
 import logging
 import os
 import unittest
 
 tests_dir = 'paip/tests'
 
-for file in os.listdir(tests_dir):
-    # Uncomment to enable test logging:
-    #logging.basicConfig(level=logging.DEBUG)
-    
-    if not file.startswith('test_') or not file.endswith('.py'):
-        continue
-    qual_file = os.path.join(tests_dir, file)
-    module = qual_file.replace('/', '.')[:-3] # leave off .py
-    print 'Testing module %s' % module
-    unittest.main(module, exit=False)
+# Uncomment to enable test logging:
+#logging.basicConfig(level=logging.DEBUG)
+
+# Every test module is loaded into one suite and run once, so there is a
+# single loader, a single runner and a single report.
+loader = unittest.TestLoader()
+suite = unittest.TestSuite()
+for qual_file in glob.glob(os.path.join(tests_dir, 'test_*.py')):
+    module = qual_file.replace(os.sep, '.')[:-3] # leave off .py
+    print 'Loading module %s' % module
+    suite.addTests(loader.loadTestsFromModule(importlib.import_module(module)))
+unittest.TextTestRunner().run(suite)